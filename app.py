@@ -1,30 +1,66 @@
 import os
 import uuid
+import secrets
+import hashlib
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from typing import List, Optional
 import io
 import boto3
 import json
+import orjson
 import base64
-import random
+import zlib
 import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import aiofiles
 from pydantic import BaseModel, Field, ValidationError
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from graph import podcast_builder
 from podcast_generator import setup_voice_for_role, generate_podcast_audio
+import aws_config
+import credentials
 from aws_config import upload_to_s3
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WEBHOOK_TIMEOUT = 10.0
+DEFAULT_EXECUTOR_WORKERS = 64
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+VOICE_FILE_FIELDS = ('host_voice_file', 'guest_voice_file')
+
+HTTP_CLIENT = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT)
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "podcasts.db")
+
+# Compiled by lifespan once the checkpointer is open; the saver needs a
+# running event loop, so neither can be built at import
+PODCAST_GRAPH = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global PODCAST_GRAPH
+    aws_config.init()
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=DEFAULT_EXECUTOR_WORKERS)
+    )
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH) as checkpointer:
+        PODCAST_GRAPH = podcast_builder.compile(checkpointer=checkpointer)
+        yield
+    await HTTP_CLIENT.aclose()
+
 app = FastAPI(title="AI Podcast Generator API", 
               description="Generate AI podcasts with customizable voices",
-              version="1.0.0")
+              version="1.0.0",
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -58,9 +94,13 @@ class UserInput(BaseModel):
     host_gender: Optional[str] = None
     guest_gender: Optional[str] = None
 
+class Inputs(BaseModel):
+    enso_input: EnsoInput
+    user_input: UserInput
+
 class RequestPayload(BaseModel):
     execution_id: str
-    inputs: Dict[str, Any]
+    inputs: Inputs
     webhook_url: Optional[str] = None
 
 class ResultResponseItem(BaseModel):
@@ -81,20 +121,59 @@ class ErrorDetail(BaseModel):
     details: Optional[str] = None
 
 def set_api_keys(api_keys):
-    """Set API keys as environment variables (temporarily for this request)"""
-    os.environ["OPENAI_API_KEY"] = api_keys.openai
-    os.environ["ANTHROPIC_API_KEY"] = api_keys.anthropic
-    os.environ["TAVILY_API_KEY"] = api_keys.tavily
-    os.environ["ELEVENLABS_API_KEY"] = api_keys.elevenlabs
+    """Set API keys for the current request context; pass the result to reset_api_keys"""
+    return credentials.set_api_keys(
+        openai=api_keys.openai,
+        anthropic=api_keys.anthropic,
+        tavily=api_keys.tavily,
+        elevenlabs=api_keys.elevenlabs
+    )
+
+async def send_webhook(webhook_url: str, response: ResponsePayload):
+    """POST the response payload to the webhook without blocking the event loop"""
+    try:
+        await asyncio.wait_for(
+            HTTP_CLIENT.post(webhook_url, json=response.model_dump()),
+            timeout=WEBHOOK_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"Failed to POST to webhook: {str(e)}")
+
+def checkpoint_thread_id(execution_id: str, topic: str, host_name: str, guest_name: str) -> str:
+    """
+    Build the checkpoint thread ID for a podcast run.
+    
+    The execution ID is client-supplied, so it is combined with a digest of the
+    inputs and the tenant's API key fingerprints. A retry with the same inputs
+    resumes its checkpoint; reusing the ID for a different podcast or tenant
+    starts a fresh run instead of returning someone else's transcript.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    parts = [topic, host_name, guest_name] + [
+        credentials.key_fingerprint(credentials.get_api_key(provider))
+        for provider in ("openai", "anthropic", "tavily", "elevenlabs")
+    ]
+    for part in parts:
+        digest.update(part.encode() + b"\0")
+    return f"{execution_id}:{digest.hexdigest()}"
+
+def default_gender(execution_id: str, role: str) -> str:
+    """
+    Pick a fallback voice gender for a role, stable for a given execution_id.
+    
+    Uses crc32 rather than hash(), which is salted per process, so retries of
+    the same execution resolve to the same voices.
+    """
+    return "male" if zlib.crc32(f"{execution_id}:{role}".encode()) & 1 else "female"
 
 async def process_podcast_request(payload: RequestPayload) -> ResponsePayload:
     """Process the podcast generation request"""
     execution_id = payload.execution_id
-    enso_input = EnsoInput(**payload.inputs.get("enso_input", {}))
-    user_input = UserInput(**payload.inputs.get("user_input", {}))
+    enso_input = payload.inputs.enso_input
+    user_input = payload.inputs.user_input
     webhook_url = payload.webhook_url
     
-    set_api_keys(enso_input.api_keys)
+    api_key_tokens = set_api_keys(enso_input.api_keys)
     
     temp_files = []
         
@@ -107,11 +186,12 @@ async def process_podcast_request(payload: RequestPayload) -> ResponsePayload:
         host_voice_file = user_input.host_voice_file if role == "host" else None
         guest_voice_file = user_input.guest_voice_file if role == "guest" else None
         
-        host_gender = user_input.host_gender or random.choice(["male", "female"])
-        guest_gender = user_input.guest_gender or random.choice(["male", "female"])
+        host_gender = user_input.host_gender or default_gender(execution_id, "host")
+        guest_gender = user_input.guest_gender or default_gender(execution_id, "guest")
         
         filename, audio_path = await run_podcast_generator(
             topic=topic,
+            execution_id=execution_id,
             host_voice_file=host_voice_file,
             host_gender=host_gender,
             guest_voice_file=guest_voice_file,
@@ -124,10 +204,6 @@ async def process_podcast_request(payload: RequestPayload) -> ResponsePayload:
                 
         s3_url = await upload_to_s3(audio_path, "genaipods", f"podcasts/{filename}", expiration=3600)
         
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-            # logger.info(f"Temporary file {audio_path} removed")
-        
         results = [
             ResultResponseItem(
                 type="audio",
@@ -151,11 +227,7 @@ async def process_podcast_request(payload: RequestPayload) -> ResponsePayload:
         )
         
         if webhook_url:
-            import requests
-            try:
-                requests.post(webhook_url, json=response.model_dump())
-            except Exception as e:
-                logger.error(f"Failed to POST to webhook: {str(e)}")
+            await send_webhook(webhook_url, response)
         
         return response
     
@@ -169,24 +241,15 @@ async def process_podcast_request(payload: RequestPayload) -> ResponsePayload:
         )
         
         if webhook_url:
-            import requests
-            try:
-                requests.post(webhook_url, json=error_response.dict())
-            except Exception as webhook_err:
-                logger.error(f"Failed to POST to webhook: {str(webhook_err)}")
+            await send_webhook(webhook_url, error_response)
         
         return error_response
     
     finally:
-        for file_path in temp_files:
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    # logger.info(f"Temporary file {file_path} removed")
-                except Exception as e:
-                    logger.error(f"Failed to remove temporary file {file_path}: {str(e)}")
+        credentials.reset_api_keys(api_key_tokens)
+        await remove_files(temp_files)
 
-async def run_podcast_generator(topic, 
+async def run_podcast_generator(topic, execution_id,
                                host_voice_file=None, host_gender=None,
                                guest_voice_file=None, guest_gender=None,
                                host_name="Host", guest_name="Guest"):
@@ -195,33 +258,39 @@ async def run_podcast_generator(topic,
     
     Args:
         topic (str): Topic for the podcast
+        execution_id (str): Execution ID, combined with the inputs to form the checkpoint thread ID
         host_voice_file (str, optional): Path to host voice file for cloning
-        host_gender (str): Gender of host ('male' or 'female')
+        host_gender (str): Gender of host ('male' or 'female'), resolved by the caller
         guest_voice_file (str, optional): Path to guest voice file for cloning
-        guest_gender (str): Gender of guest ('male' or 'female')
+        guest_gender (str): Gender of guest ('male' or 'female'), resolved by the caller
         host_name (str): Name of the host
         guest_name (str): Name of the guest
         
     Returns:
         tuple: Filename and path of the generated podcast audio
     """
-    host_gender = host_gender or random.choice(["male", "female"])
-    guest_gender = guest_gender or random.choice(["male", "female"])
-    
-    memory = MemorySaver()
-    graph = podcast_builder.compile(checkpointer=memory)
-    thread = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    graph = PODCAST_GRAPH
+    thread = {"configurable": {"thread_id": checkpoint_thread_id(execution_id, topic, host_name, guest_name)}}
     
-    host_voice, host_gender = await setup_voice_for_role('host', host_voice_file, host_gender)
-    guest_voice, guest_gender = await setup_voice_for_role('guest', guest_voice_file, guest_gender)
+    (host_voice, host_gender), (guest_voice, guest_gender) = await asyncio.gather(
+        setup_voice_for_role('host', host_voice_file, host_gender),
+        setup_voice_for_role('guest', guest_voice_file, guest_gender)
+    )
     
-    # logger.info(f"Generating podcast on topic: {topic}")
-    async for _ in graph.astream({"topic": topic, "host": host_name, "guest": guest_name}, thread, stream_mode="updates"):
-        # logger.info(event)
-        continue
+    # A retried execution resumes from its last checkpoint instead of
+    # re-running the whole LLM pipeline.
+    snapshot = await graph.aget_state(thread)
+    transcript = snapshot.values.get('final_transcript')
     
-    final_state = graph.get_state(thread)
-    transcript = final_state.values.get('final_transcript')
+    if not transcript:
+        graph_input = None if snapshot.next else {"topic": topic, "host": host_name, "guest": guest_name}
+        # logger.info(f"Generating podcast on topic: {topic}")
+        async for _ in graph.astream(graph_input, thread, stream_mode="updates"):
+            # logger.info(event)
+            continue
+        
+        final_state = await graph.aget_state(thread)
+        transcript = final_state.values.get('final_transcript')
     
     if not transcript:
         raise ValueError("Failed to generate transcript")
@@ -247,12 +316,15 @@ async def save_uploaded_file(file: UploadFile) -> str:
         temp_dir = os.path.join(tempfile.gettempdir(), "voice_file_uploads")
         os.makedirs(temp_dir, exist_ok=True)
         
-        filename = f"{uuid.uuid4().hex}_{file.filename}"
+        filename = f"{secrets.token_hex(16)}_{file.filename}"
         file_path = os.path.join(temp_dir, filename)
         
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        async with aiofiles.open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await f.write(chunk)
             
         # logger.info(f"Successfully saved uploaded file to {file_path}")
         return file_path
@@ -269,12 +341,12 @@ async def save_base64_file(base64_data: str) -> str:
         if "base64," in base64_data:
             base64_data = base64_data.split("base64,")[1]
         
-        filename = f"{uuid.uuid4().hex}.mp3"
+        filename = f"{secrets.token_hex(16)}.mp3"
         file_path = os.path.join(temp_dir, filename)
         
-        content = base64.b64decode(base64_data)
-        with open(file_path, "wb") as f:
-            f.write(content)
+        content = await asyncio.to_thread(base64.b64decode, base64_data)
+        async with aiofiles.open(file_path, "wb") as f:
+            await f.write(content)
             
         # logger.info(f"Successfully saved base64 file to {file_path}")
         return file_path
@@ -282,24 +354,50 @@ async def save_base64_file(base64_data: str) -> str:
         logger.error(f"Error saving base64 file: {str(e)}", exc_info=True)
         raise ValueError(f"Failed to save base64 file: {str(e)}")
 
+def _safe_unlink(file_path):
+    """Remove a file if it exists, logging rather than raising on failure"""
+    try:
+        if file_path and os.path.exists(file_path):
+            os.unlink(file_path)
+            # logger.info(f"Temporary file {file_path} removed")
+    except Exception as e:
+        logger.error(f"Failed to remove temporary file {file_path}: {str(e)}")
+
+async def remove_files(file_paths):
+    """Remove files concurrently on worker threads"""
+    await asyncio.gather(*(asyncio.to_thread(_safe_unlink, path) for path in file_paths))
+
 async def cleanup_files(json_data: dict):
     """Clean up any temporary files created during request processing"""
     try:
         if 'inputs' in json_data and 'user_input' in json_data['inputs']:
             user_input = json_data['inputs']['user_input']
-            for file_key in ['host_voice_file', 'guest_voice_file']:
-                if file_key in user_input and isinstance(user_input[file_key], str):
-                    file_path = user_input[file_key]
-                    if os.path.exists(file_path):
-                        os.unlink(file_path)
-                        # logger.info(f"Cleaned up temporary file: {file_path}")
+            await remove_files(
+                user_input[file_key] for file_key in VOICE_FILE_FIELDS
+                if isinstance(user_input.get(file_key), str)
+            )
     except Exception as e:
         logger.error(f"Error during file cleanup: {str(e)}", exc_info=True)
         
+async def process_podcast_request_in_background(payload: RequestPayload, json_data: dict):
+    """Run podcast generation after the response has been sent"""
+    try:
+        await process_podcast_request(payload)
+    except Exception as e:
+        await cleanup_files(json_data)
+        logger.error(f"Error processing podcast request: {str(e)}", exc_info=True)
+
 @app.post("/generate-podcast", response_model=ResponsePayload)
-async def generate_podcast(request: Request, background_tasks: BackgroundTasks):
+async def generate_podcast(request: Request, background_tasks: BackgroundTasks, sync: bool = False):
     """
-    Handle podcast generation with both JSON fields and binary files
+    Handle podcast generation with both JSON fields and binary files.
+    
+    Multipart requests carry the JSON request in a ``payload`` form field,
+    alongside optional ``host_voice_file``/``guest_voice_file`` uploads.
+    
+    By default generation runs as a background task and the request returns
+    202 immediately; results are delivered to ``webhook_url``. Pass
+    ``?sync=true`` to wait for the finished podcast in the response instead.
     """
     logger.info("Received request for podcast generation")
     
@@ -311,15 +409,22 @@ async def generate_podcast(request: Request, background_tasks: BackgroundTasks):
     if content_type.startswith('multipart/form-data'):
         form_data = await request.form()
         
-        for key in form_data:
-            if key != 'host_voice_file' and key != 'guest_voice_file':
-                json_value = form_data[key]
-                if isinstance(json_value, str):
-                    try:
-                        json_data = json.loads(json_value)
-                        break 
-                    except json.JSONDecodeError:
-                        continue
+        payload_field = form_data.get('payload')
+        if isinstance(payload_field, str):
+            try:
+                json_data = orjson.loads(payload_field)
+            except orjson.JSONDecodeError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON in payload field: {str(e)}")
+        else:
+            # Legacy clients: accept the first non-file field that holds JSON
+            for key, json_value in form_data.items():
+                if key in VOICE_FILE_FIELDS or not isinstance(json_value, str):
+                    continue
+                try:
+                    json_data = json.loads(json_value)
+                    break
+                except json.JSONDecodeError:
+                    continue
         
         if not json_data:
             try:
@@ -343,22 +448,18 @@ async def generate_podcast(request: Request, background_tasks: BackgroundTasks):
         if 'user_input' not in json_data['inputs']:
             json_data['inputs']['user_input'] = {}
         
-        if 'host_voice_file' in form_data:
-            file = form_data['host_voice_file']
-            if isinstance(file, UploadFile):
-                file_path = await save_uploaded_file(file)
-                json_data['inputs']['user_input']['host_voice_file'] = file_path
-                logger.info(f"Saved host voice file to {file_path}")
-        
-        if 'guest_voice_file' in form_data:
-            file = form_data['guest_voice_file']
+        for file_key in VOICE_FILE_FIELDS:
+            file = form_data.get(file_key)
             if isinstance(file, UploadFile):
                 file_path = await save_uploaded_file(file)
-                json_data['inputs']['user_input']['guest_voice_file'] = file_path
-                logger.info(f"Saved guest voice file to {file_path}")
+                json_data['inputs']['user_input'][file_key] = file_path
+                logger.info(f"Saved {file_key} to {file_path}")
                 
     elif content_type.startswith('application/json'):
-        json_data = await request.json()
+        try:
+            json_data = orjson.loads(await request.body())
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
         
         if 'inputs' in json_data and 'user_input' in json_data['inputs']:
             user_input = json_data['inputs']['user_input']
@@ -387,16 +488,34 @@ async def generate_podcast(request: Request, background_tasks: BackgroundTasks):
             detail=f"Unsupported media type: {content_type}. Use 'multipart/form-data' or 'application/json'."
         )
     
+    if isinstance(json_data, dict) and 'execution_id' in json_data:
+        request.state.execution_id = json_data['execution_id']
+    
     try:
-        payload = RequestPayload(**json_data)
-        if hasattr(payload, 'execution_id'):
-            request.state.execution_id = payload.execution_id
+        payload = RequestPayload.model_validate(json_data)
     except ValidationError as e:
         await cleanup_files(json_data)
-        if 'execution_id' in json_data:
-            request.state.execution_id = json_data['execution_id']
         raise HTTPException(status_code=422, detail=f"Validation error: {str(e)}")
     
+    if not sync:
+        if not payload.webhook_url:
+            await cleanup_files(json_data)
+            raise HTTPException(
+                status_code=400,
+                detail="webhook_url is required unless the request is made with sync=true"
+            )
+        
+        background_tasks.add_task(process_podcast_request_in_background, payload, json_data)
+        return ORJSONResponse(
+            status_code=202,
+            content=ResponsePayload(
+                execution_id=payload.execution_id,
+                status="accepted",
+                message="Podcast generation started; results will be sent to the webhook",
+                results=[]
+            ).model_dump()
+        )
+    
     try:
         response = await process_podcast_request(payload)
         return response
@@ -419,11 +538,18 @@ async def health_check():
 async def root():
     return {"message": "Welcome to the GenAI Podcast Generator Agent API!"}
 
+def get_execution_id(request: Request) -> str:
+    """Execution ID for error responses: parsed body, then X-Execution-Id header, then a new UUID"""
+    execution_id = getattr(request.state, "execution_id", None)
+    if execution_id is None:
+        execution_id = request.headers.get("X-Execution-Id") or str(uuid.uuid4())
+    return execution_id
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    execution_id = getattr(request.state, "execution_id", str(uuid.uuid4()))
+    execution_id = get_execution_id(request)
     logger.error(f"HTTP exception: {exc.detail} (status: {exc.status_code}, execution_id: {execution_id})")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "execution_id": execution_id,
@@ -435,9 +561,9 @@ async def http_exception_handler(request, exc):
 
 @app.exception_handler(Exception)
 async def generic_exception_handler(request, exc):
-    execution_id = getattr(request.state, "execution_id", str(uuid.uuid4()))
+    execution_id = get_execution_id(request)
     logger.error(f"Unhandled exception: {str(exc)} (execution_id: {execution_id})", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "execution_id": execution_id,
@@ -447,28 +573,6 @@ async def generic_exception_handler(request, exc):
         },
     )
     
-@app.middleware("http")
-async def extract_execution_id(request: Request, call_next):
-    try:
-        content_type = request.headers.get('Content-Type', '')
-        
-        if content_type.startswith('application/json'):
-            body = await request.body()
-            if body:
-                json_data = json.loads(body)
-                if 'execution_id' in json_data:
-                    request.state.execution_id = json_data['execution_id']
-                    await request._receive()
-        
-        elif content_type.startswith('multipart/form-data'):
-            pass
-        
-        response = await call_next(request)
-        return response
-    except Exception as e:
-        logger.error(f"Error in execution_id middleware: {str(e)}")
-        return await call_next(request)
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
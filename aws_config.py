@@ -1,32 +1,97 @@
+import asyncio
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 import os
 import logging
+import threading
 from dotenv import load_dotenv
-load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def configure_s3():
+MB = 1024 * 1024
+
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=8 * MB,
+    max_concurrency=10,
+    use_threads=True
+)
+
+# Each upload runs up to max_concurrency transfer threads; cap concurrent
+# uploads so they don't starve the shared thread pool.
+MAX_CONCURRENT_UPLOADS = 4
+_UPLOAD_SEM = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+_AWS_KEY = None
+_AWS_SECRET = None
+_AWS_REGION = None
+_initialized = False
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def init():
     """
-    Configure S3 client with credentials from environment variables
+    Load .env, resolve AWS credentials and build the shared S3 client.
+    
+    Called from the app lifespan at startup so client construction (service
+    model loading, credential chain resolution) happens before the event loop
+    is serving requests; safe to call more than once.
     """
-    required_vars = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_REGION"]
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    global _AWS_KEY, _AWS_SECRET, _AWS_REGION, _initialized
+    if _initialized:
+        return
     
+    load_dotenv()
+    _AWS_KEY = os.getenv('AWS_ACCESS_KEY_ID')
+    _AWS_SECRET = os.getenv('AWS_SECRET_ACCESS_KEY')
+    _AWS_REGION = os.getenv('AWS_REGION')
+    _initialized = True
+    
+    missing_vars = [
+        var for var, value in (
+            ("AWS_ACCESS_KEY_ID", _AWS_KEY),
+            ("AWS_SECRET_ACCESS_KEY", _AWS_SECRET),
+            ("AWS_REGION", _AWS_REGION),
+        ) if not value
+    ]
     if missing_vars:
         logger.warning(f"Missing AWS environment variables: {', '.join(missing_vars)}")
         logger.warning("S3 uploads may fail without proper credentials")
     
+    _get_s3_client()
+
+def configure_s3():
+    """
+    Configure S3 client with the credentials resolved by init()
+    """
+    init()
+    
     return boto3.client(
         's3',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        region_name=os.getenv('AWS_REGION')
+        aws_access_key_id=_AWS_KEY,
+        aws_secret_access_key=_AWS_SECRET,
+        region_name=_AWS_REGION,
+        config=Config(max_pool_connections=50, retries={'max_attempts': 3})
     )
+
+def _get_s3_client():
+    """
+    Return the shared S3 client, creating it on first use.
+    
+    boto3 clients are thread-safe, so a single instance (and its connection
+    pool) is reused across requests.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = configure_s3()
+    return _s3_client
     
-async def generate_presigned_url(bucket_name, object_key, expiration=3600):
+def generate_presigned_url(bucket_name, object_key, expiration=3600):
     """
     Generate a presigned URL for an S3 object
     
@@ -38,7 +103,7 @@ async def generate_presigned_url(bucket_name, object_key, expiration=3600):
     Returns:
         str: Presigned URL
     """
-    s3_client = await configure_s3()
+    s3_client = _get_s3_client()
     
     presigned_url = s3_client.generate_presigned_url(
         'get_object',
@@ -70,13 +135,18 @@ async def upload_to_s3(file_path, bucket_name, object_key, expiration=3600):
     if object_key is None:
         object_key = os.path.basename(file_path)
         
-    s3_client = await configure_s3()
+    s3_client = _get_s3_client()
+    
+    # Presign up front, off the critical path after the upload; it runs on a
+    # worker thread because refreshable credentials may refresh over the network.
+    presigned_url = await asyncio.to_thread(generate_presigned_url, bucket_name, object_key, expiration)
     
     try:
-        s3_client.upload_file(file_path, bucket_name, object_key)
+        async with _UPLOAD_SEM:
+            await asyncio.to_thread(s3_client.upload_file, file_path, bucket_name, object_key, Config=S3_TRANSFER_CONFIG)
         # logger.info(f"Successfully uploaded file to s3://{bucket_name}/{object_key}")
     except Exception as e:
         logger.error(f"Failed to upload file to S3: {str(e)}")
         raise e
     
-    return await generate_presigned_url(bucket_name, object_key, expiration)
\ No newline at end of file
+    return presigned_url
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
 from enum import Enum
 from dataclasses import dataclass, fields
+from functools import lru_cache
 from typing import Any, Optional
 
 from langchain_core.runnables import RunnableConfig
@@ -51,13 +52,24 @@ class Configuration:
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """Create a Configuration instance from a RunnableConfig.
+
+        Instances are memoized on the configurable values of the dataclass
+        fields, so nodes sharing a config get the same (read-only) instance.
+        """
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
-        values: dict[str, Any] = {
-            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
-            for f in fields(cls)
-            if f.init
-        }
-        return cls(**{k: v for k, v in values.items() if v})
\ No newline at end of file
+        items = tuple((f.name, configurable.get(f.name)) for f in fields(cls) if f.init)
+        try:
+            return _build_configuration(cls, items)
+        except TypeError:
+            # Unhashable configurable values can't be memoized
+            return _build_configuration.__wrapped__(cls, items)
+
+@lru_cache(maxsize=32)
+def _build_configuration(cls: type[Configuration], items: tuple) -> Configuration:
+    values: dict[str, Any] = {
+        name: os.environ.get(name.upper(), value) for name, value in items
+    }
+    return cls(**{k: v for k, v in values.items() if v})
@@ -0,0 +1,66 @@
+import os
+import hashlib
+from contextvars import ContextVar, Token
+from typing import Optional
+
+OPENAI_API_KEY: ContextVar[Optional[str]] = ContextVar("openai_api_key", default=None)
+ANTHROPIC_API_KEY: ContextVar[Optional[str]] = ContextVar("anthropic_api_key", default=None)
+TAVILY_API_KEY: ContextVar[Optional[str]] = ContextVar("tavily_api_key", default=None)
+ELEVENLABS_API_KEY: ContextVar[Optional[str]] = ContextVar("elevenlabs_api_key", default=None)
+
+_API_KEYS = {
+    "openai": (OPENAI_API_KEY, "OPENAI_API_KEY"),
+    "anthropic": (ANTHROPIC_API_KEY, "ANTHROPIC_API_KEY"),
+    "tavily": (TAVILY_API_KEY, "TAVILY_API_KEY"),
+    "elevenlabs": (ELEVENLABS_API_KEY, "ELEVENLABS_API_KEY"),
+}
+
+def get_api_key(provider: str) -> Optional[str]:
+    """
+    Return the API key for a provider.
+
+    Keys set for the current request context take precedence; otherwise the
+    provider's environment variable is used.
+
+    Args:
+        provider (str): One of 'openai', 'anthropic', 'tavily', 'elevenlabs'
+
+    Returns:
+        str | None: The API key, if one is configured
+    """
+    var, env_name = _API_KEYS[provider]
+    return var.get() or os.environ.get(env_name)
+
+def set_api_keys(**keys: str) -> list[tuple[ContextVar, Token]]:
+    """
+    Set API keys for the current context only.
+
+    Args:
+        **keys: Provider name to API key, e.g. openai="sk-..."
+
+    Returns:
+        list: Tokens to pass to reset_api_keys()
+    """
+    return [(_API_KEYS[provider][0], _API_KEYS[provider][0].set(key)) for provider, key in keys.items()]
+
+def reset_api_keys(tokens: list[tuple[ContextVar, Token]]):
+    """Restore the API keys that were in effect before set_api_keys()"""
+    for var, token in reversed(tokens):
+        var.reset(token)
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """
+    Return a short, non-reversible fingerprint of an API key.
+
+    Used to scope shared caches and checkpoints to the tenant whose key is in
+    effect without storing the key itself.
+
+    Args:
+        api_key (str | None): The API key
+
+    Returns:
+        str: Hex digest, or an empty string when no key is set
+    """
+    if not api_key:
+        return ""
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
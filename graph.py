@@ -1,89 +1,125 @@
-from typing import Literal
+import os
+import asyncio
+from functools import lru_cache
+from typing import Optional
 
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.messages import HumanMessage
 from langchain.chat_models import init_chat_model
 from langchain_core.runnables import RunnableConfig
+from langchain_core.globals import set_llm_cache
 
-from langgraph.constants import Send
 from langgraph.graph import START, END, StateGraph
-from langgraph.types import interrupt, Command
+from langgraph.types import Send, interrupt
 from langchain_core.tools import tool
 
-from state import PodcastStateInput, PodcastStateOutput, Segments, PodcastState, SegmentState, SegmentOutputState, Queries, DialogueFeedback
-from prompts import podcast_planner_query_writer_instructions, podcast_planner_instructions, query_writer_instructions, dialogue_writer_instructions, transcript_optimizer_instructions, final_segment_writer_instructions
+from state import PodcastStateInput, PodcastStateOutput, Segments, PodcastState, SegmentState, Queries, SearchQuery, DialogueWithFeedback
+from prompts import (
+    podcast_planner_query_writer_instructions, podcast_planner_query_writer_context,
+    podcast_planner_instructions, podcast_planner_context,
+    dialogue_writer_instructions, dialogue_writer_context,
+    final_segment_writer_instructions, final_segment_writer_context
+)
 from configuration import Configuration
-from utils import tavily_search_async, deduplicate_and_format_sources, format_segments, get_config_value
+from credentials import get_api_key
+from utils import tavily_search_async, deduplicate_and_format_sources, format_segments, get_config_value, build_cached_system, ScopedTTLSQLiteCache
+
+# Exact-match response cache for deterministic (temperature 0) calls, scoped
+# per tenant and expiring after LLM_CACHE_TTL seconds; set LLM_CACHE_PATH to
+# an empty string to disable it.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+if LLM_CACHE_PATH:
+    set_llm_cache(ScopedTTLSQLiteCache(database_path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL))
+
+@lru_cache(maxsize=8)
+def _get_model(model: str, provider: str, temperature: float, api_key: Optional[str]):
+    # Sampled outputs are meant to vary, so only temperature 0 models use the cache
+    return init_chat_model(
+        model=model,
+        model_provider=provider,
+        api_key=api_key,
+        temperature=temperature,
+        cache=None if temperature == 0 else False
+    )
+
+@lru_cache(maxsize=16)
+def _get_structured_model(model: str, provider: str, temperature: float, api_key: Optional[str], schema: type):
+    return _get_model(model, provider, temperature, api_key).with_structured_output(schema)
+
+def get_writer_model(configurable: Configuration, temperature: float, schema: Optional[type] = None):
+    """ Return the cached writer model (optionally bound to a structured output schema) for the current API key """
+
+    model = get_config_value(configurable.writer_model)
+    provider = get_config_value(configurable.writer_provider)
+    api_key = get_api_key(provider)
+    if schema is None:
+        return _get_model(model, provider, temperature, api_key)
+    return _get_structured_model(model, provider, temperature, api_key, schema)
 
 async def generate_podcast_plan(state: PodcastState, config: RunnableConfig):
     topic = state["topic"]
-    host = state["host"]
-    guest = state["guest"]
     configurable = Configuration.from_runnable_config(config)
     podcast_structure = configurable.podcast_structure
     number_of_queries = configurable.number_of_queries
+    provider = get_config_value(configurable.writer_provider)
 
-    writer_model = init_chat_model(
-        model=get_config_value(configurable.writer_model),
-        model_provider=get_config_value(configurable.writer_provider),
-        temperature=0
-    )
-    structured_llm = writer_model.with_structured_output(Queries)
+    structured_llm = get_writer_model(configurable, temperature=0, schema=Queries)
 
-    query_results = structured_llm.invoke([
-        SystemMessage(content=podcast_planner_query_writer_instructions.format(
+    query_results = await structured_llm.ainvoke([
+        build_cached_system(podcast_planner_query_writer_instructions, podcast_planner_query_writer_context.format(
             topic=topic,
             podcast_organization=podcast_structure,
             number_of_queries=number_of_queries
-        )),
+        ), provider),
         HumanMessage(content="Generate search queries for podcast research")
     ])
 
     search_results = await tavily_search_async([q.search_query for q in query_results.queries])
     source_str = deduplicate_and_format_sources(search_results, max_tokens_per_source=500)
 
-    structured_llm = writer_model.with_structured_output(Segments)
-    podcast_segments = structured_llm.invoke([
-        AIMessage(content=podcast_planner_instructions.format(
+    structured_llm = get_writer_model(configurable, temperature=0, schema=Segments)
+    podcast_segments = await structured_llm.ainvoke([
+        build_cached_system(podcast_planner_instructions, podcast_planner_context.format(
             topic=topic,
             podcast_structure=podcast_structure,
-            context=source_str
-        )),
+            context=source_str,
+            number_of_queries=number_of_queries
+        ), provider),
         HumanMessage(content="Generate the podcast segments")
     ])
     
     non_research = [s for s in podcast_segments.segments if not s.research]
 
-    return Command(
-        goto=[
-            Send("build_segment_with_research", {
-                "segment": s,
-                "search_iterations": 0,
-                "host": host,
-                "guest": guest
-            }) for s in podcast_segments.segments if s.research
-        ],
-        update={"segments": podcast_segments.segments, "completed_segments": non_research}
-    )
-    
-def generate_queries(state: SegmentState, config: RunnableConfig):
-    """ Generate search queries for a report section """
-
-    segment = state["segment"]
+    return {"segments": podcast_segments.segments, "completed_segments": {s.title: s for s in non_research}}
 
-    configurable = Configuration.from_runnable_config(config)
-    number_of_queries = configurable.number_of_queries
+def route_research_segments(state: PodcastState):
+    """ Send each research segment to its own build_segment branch so finished segments are checkpointed individually """
 
-    writer_provider = get_config_value(configurable.writer_provider)
-    writer_model_name = get_config_value(configurable.writer_model)
-    writer_model = init_chat_model(model=writer_model_name, model_provider=writer_provider, temperature=0) 
-    structured_llm = writer_model.with_structured_output(Queries)
+    sends = [
+        Send("build_segment", {
+            "segment": s,
+            "search_iterations": 0,
+            "host": state["host"],
+            "guest": state["guest"]
+        }) for s in state["segments"] if s.research
+    ]
+    return sends or "write_intro_outro"
 
-    system_instructions = query_writer_instructions.format(segment_topic=segment.description, number_of_queries=number_of_queries)
-
-    queries = structured_llm.invoke([SystemMessage(content=system_instructions)]+[HumanMessage(content="Generate search queries on the provided topic.")])
-
-    return {"search_queries": queries.queries}
+async def build_segment(state: SegmentState, config: RunnableConfig):
+    """ Search with the planner's queries, then write until the dialogue passes review or the search depth is reached """
 
+    segment = state["segment"]
+    # Fall back to the segment description if the planner left the queries empty
+    search_queries = segment.search_queries or [SearchQuery(search_query=segment.description)]
+    state = {**state, "search_queries": search_queries}
+    while True:
+        state.update(await search_web(state, config))
+        update = await write_dialogue(state, config)
+        if "completed_segments" in update:
+            segment = update["completed_segments"][0]
+            return {"completed_segments": {segment.title: segment}}
+        state.update(update)
+    
 async def search_web(state: SegmentState, config: RunnableConfig):
     """ Search the web for each query, then return a list of raw sources and a formatted string of sources."""
     
@@ -103,7 +139,7 @@ async def search_web(state: SegmentState, config: RunnableConfig):
 
     return {"source_str": source_str, "search_iterations": state["search_iterations"] + 1}
 
-def write_dialogue(state: SegmentState, config: RunnableConfig) -> Command[Literal[END, "search_web"]]:
+async def write_dialogue(state: SegmentState, config: RunnableConfig):
     segment = state["segment"]
     source_str = state["source_str"]
     host = state["host"]
@@ -111,137 +147,106 @@ def write_dialogue(state: SegmentState, config: RunnableConfig) -> Command[Liter
     
     configurable = Configuration.from_runnable_config(config)
     
-    writer_model = init_chat_model(
-        model=get_config_value(configurable.writer_model),
-        model_provider=get_config_value(configurable.writer_provider),
-        temperature=0.7  
-    )
+    provider = get_config_value(configurable.writer_provider)
+    structured_llm = get_writer_model(configurable, temperature=0.7, schema=DialogueWithFeedback)
 
-    dialogue = writer_model.invoke([
-        SystemMessage(content=dialogue_writer_instructions.format(
+    # One call writes the dialogue and reviews it
+    result = await structured_llm.ainvoke([
+        build_cached_system(dialogue_writer_instructions, dialogue_writer_context.format(
             segment_topic=segment.description,
             context=source_str,
             host_name=host,
             guest_name=guest,
-        )),
-        HumanMessage(content="Generate podcast dialogue for this segment")
+        ), provider),
+        HumanMessage(content="Generate podcast dialogue for this segment, then review it")
     ])
     
-    segment.dialogue = dialogue.content
+    segment.dialogue = result.dialogue
 
-    structured_llm = writer_model.with_structured_output(DialogueFeedback)
-    feedback = structured_llm.invoke([
-        SystemMessage(content=transcript_optimizer_instructions.format(
-            transcript=segment.dialogue
-        )),
-        HumanMessage(content="Review and optimize the dialogue")
-    ])
+    if result.grade == "pass":
+        return {"completed_segments": [segment]}
+
+    if result.follow_up_queries and state["search_iterations"] < int(configurable.max_search_depth):
+        return {
+            "search_queries": result.follow_up_queries,
+            "segment": segment
+        }
+
+    if result.revised_transcript:
+        segment.dialogue = result.revised_transcript
+    return {"completed_segments": [segment]}
 
-    if feedback.grade == "pass" or state["search_iterations"] >= config.max_search_depth:
-        return Command(
-            update={"completed_segments": [segment]},
-            goto=END
-        )
-    else:
-        return Command(
-            update={
-                "search_queries": feedback.follow_up_queries,
-                "segment": segment
-            },
-            goto="search_web"
-        )
-
-def write_intro_outro(state: PodcastState, config: RunnableConfig):
+async def write_intro_outro(state: PodcastState, config: RunnableConfig):
     segments = state["segments"]
-    completed_segments = state.get("completed_segments", [])
+    completed_segments = state.get("completed_segments", {})
     
-    intro_segment = next((s for s in segments if s.title.lower() == "intro"), None)
-    outro_segment = next((s for s in segments if s.title.lower() == "outro"), None)
+    by_title = {s.title.lower(): s for s in segments}
+    intro_segment = by_title.get("intro")
+    outro_segment = by_title.get("outro")
     
     configurable = Configuration.from_runnable_config(config)
     
-    writer_model = init_chat_model(
-        model=get_config_value(configurable.writer_model),
-        model_provider=get_config_value(configurable.writer_provider),
-        temperature=0.7
-    )
+    provider = get_config_value(configurable.writer_provider)
+    writer_model = get_writer_model(configurable, temperature=0.7)
     
-    new_completed = []
-    episode_segments = format_segments(completed_segments)
+    episode_segments = format_segments(completed_segments.values())
     
-    if intro_segment and intro_segment not in completed_segments:
-        dialogue = writer_model.invoke([
-            SystemMessage(content=final_segment_writer_instructions.format(
-                segment_type="opening",
-                context=episode_segments
-            )),
-            HumanMessage(content="Generate engaging intro dialogue")
-        ])
-        intro_segment.dialogue = dialogue.content
-        new_completed.append(intro_segment)
-    
-    if outro_segment and outro_segment not in completed_segments:
-        dialogue = writer_model.invoke([
-            SystemMessage(content=final_segment_writer_instructions.format(
-                segment_type="closing",
+    # Intro and outro only depend on the finished segments, so write them concurrently
+    pending = []
+    if intro_segment and intro_segment.title not in completed_segments:
+        pending.append((intro_segment, "opening", "Generate engaging intro dialogue"))
+    if outro_segment and outro_segment.title not in completed_segments:
+        pending.append((outro_segment, "closing", "Generate memorable outro dialogue"))
+    
+    dialogues = await asyncio.gather(*[
+        writer_model.ainvoke([
+            build_cached_system(final_segment_writer_instructions, final_segment_writer_context.format(
+                segment_type=segment_type,
                 context=episode_segments
-            )),
-            HumanMessage(content="Generate memorable outro dialogue")
-        ])
-        outro_segment.dialogue = dialogue.content
-        new_completed.append(outro_segment)
+            ), provider),
+            HumanMessage(content=request)
+        ]) for _, segment_type, request in pending
+    ])
     
-    updated_completed = completed_segments + new_completed
+    new_completed = {}
+    for (segment, _, _), dialogue in zip(pending, dialogues):
+        segment.dialogue = dialogue.content
+        new_completed[segment.title] = segment
     
+    # The reducer merges new_completed into completed_segments, so only send the new ones
     return {
-        "completed_segments": updated_completed,
-        "episode_segments_from_research": format_segments(updated_completed)
+        "completed_segments": new_completed,
+        "episode_segments_from_research": format_segments([*completed_segments.values(), *new_completed.values()])
     }
     
 def compile_final_transcript(state: PodcastState):
     segments = state["segments"]
-    completed_segments = {s.title: s.dialogue for s in state.get("completed_segments", [])}
+    completed_segments = state.get("completed_segments", {})
     
     missing = [s.title for s in segments if s.title not in completed_segments]
     if missing:
         raise ValueError(f"Missing processed segments: {', '.join(missing)}")
 
     for segment in segments:
-        segment.dialogue = completed_segments[segment.title]
+        segment.dialogue = completed_segments[segment.title].dialogue
         
     final_transcript = "\n\n".join([s.dialogue for s in segments])
     return {"final_transcript": final_transcript}
 
 
-segment_builder = StateGraph(SegmentState, output=SegmentOutputState)
-segment_builder.add_node("generate_queries", generate_queries)
-segment_builder.add_node("search_web", search_web) 
-segment_builder.add_node("write_dialogue", write_dialogue)
-
-segment_builder.add_edge(START, "generate_queries")
-segment_builder.add_edge("generate_queries", "search_web")
-segment_builder.add_edge("search_web", "write_dialogue")
-
 podcast_builder = StateGraph(PodcastState, 
                           input=PodcastStateInput,
                           output=PodcastStateOutput,
                           config_schema=Configuration)
 
 podcast_builder.add_node("generate_podcast_plan", generate_podcast_plan)
-podcast_builder.add_node("build_segment_with_research", segment_builder.compile())
+podcast_builder.add_node("build_segment", build_segment)
 podcast_builder.add_node("write_intro_outro", write_intro_outro)
 podcast_builder.add_node("compile_final_transcript", compile_final_transcript)
 
 podcast_builder.add_edge(START, "generate_podcast_plan")
-podcast_builder.add_conditional_edges(
-   "generate_podcast_plan",
-   lambda edges: (
-       "build_segment_with_research"
-       if edges.get("goto")
-       else "write_intro_outro"
-   )
-)
-podcast_builder.add_edge("build_segment_with_research", "write_intro_outro")
+podcast_builder.add_conditional_edges("generate_podcast_plan", route_research_segments, ["build_segment", "write_intro_outro"])
+podcast_builder.add_edge("build_segment", "write_intro_outro")
 podcast_builder.add_edge("write_intro_outro", "compile_final_transcript")
 podcast_builder.add_edge("compile_final_transcript", END)
 
@@ -1,5 +1,5 @@
 import re
-import io
+import asyncio
 import os
 import json
 import random
@@ -9,11 +9,37 @@ from datetime import datetime
 from elevenlabs.client import ElevenLabs, VoiceSettings, Voice
 from pydub import AudioSegment
 from dotenv import load_dotenv
-from voice_clone import init_client, load_voice_config, clone_voice
+from voice_clone import init_client, load_voice_config, clone_voice_async
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_STAR_RE = re.compile(r'\*+')
+
+# Concurrent ElevenLabs TTS requests per process, shared by every podcast
+# being generated; keep within the account's concurrency limit to avoid 429s.
+TTS_CONCURRENCY = int(os.getenv("ELEVENLABS_TTS_CONCURRENCY", "4"))
+_TTS_SEM = asyncio.Semaphore(TTS_CONCURRENCY)
+
+# ElevenLabs pcm_* formats are 16-bit mono little-endian samples
+PCM_OUTPUT_FORMAT = "pcm_24000"
+PCM_FRAME_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+
+HOST_VOICE_SETTINGS = VoiceSettings(
+    stability=0.45,
+    similarity_boost=0.75,
+    style=0.30,
+    use_speaker_boost=True
+)
+
+GUEST_VOICE_SETTINGS = VoiceSettings(
+    stability=0.50,
+    similarity_boost=0.65,
+    style=0.40,
+    use_speaker_boost=True
+)
+
 async def preprocess_transcript(transcript, host_name, guest_name):
     """
     Clean and preprocess the transcript for TTS conversion.
@@ -26,26 +52,30 @@ async def preprocess_transcript(transcript, host_name, guest_name):
     Returns:
         list: Cleaned conversation entries
     """
-    transcript = re.sub(r'\*+', '', transcript)
+    transcript = _STAR_RE.sub('', transcript)
+    
+    host_prefix = f"{host_name}:"
+    guest_prefix = f"{guest_name}:"
+    host_prefix_len = len(host_prefix)
+    guest_prefix_len = len(guest_prefix)
     
-    lines = transcript.split('\n')
     conversations = []
     
-    for line in lines:
+    for line in transcript.split('\n'):
         line = line.strip()
         
         if not line:
             continue
         
-        if line.startswith(f"{host_name}:"):
+        if line.startswith(host_prefix):
             conversations.append({
                 'role': 'host',
-                'text': line.replace(f"{host_name}:", '').strip()
+                'text': line[host_prefix_len:].strip()
             })
-        elif line.startswith(f"{guest_name}:"):
+        elif line.startswith(guest_prefix):
             conversations.append({
                 'role': 'guest',
-                'text': line.replace(f"{guest_name}:", '').strip()
+                'text': line[guest_prefix_len:].strip()
             })
     
     return conversations
@@ -62,15 +92,19 @@ async def select_voice_id(gender, config=None):
         str: Selected voice ID
     """
     if config is None:
-        config = await load_voice_config()
+        config = load_voice_config()
         
     gender = gender.lower()
     if gender == 'male':
-        return random.choice(config['males'])
+        voice_ids = config['males']
     elif gender == 'female':
-        return random.choice(config['females'])
+        voice_ids = config['females']
     else:
         raise ValueError("Gender must be 'male' or 'female'")
+    
+    if not voice_ids:
+        raise ValueError(f"No {gender} voices configured")
+    return random.choice(voice_ids)
 
 async def setup_voices(host_voice=None, host_gender=None, guest_voice=None, guest_gender=None):
     """
@@ -85,37 +119,59 @@ async def setup_voices(host_voice=None, host_gender=None, guest_voice=None, gues
     Returns:
         dict: Voice configuration for host and guest
     """
-    config = await load_voice_config()
-    
-    host_voice_settings = VoiceSettings(
-        stability=0.45,
-        similarity_boost=0.75,
-        style=0.30,
-        use_speaker_boost=True
-    )
-    
-    guest_voice_settings = VoiceSettings(
-        stability=0.50,
-        similarity_boost=0.65,
-        style=0.40,
-        use_speaker_boost=True
-    )
+    config = load_voice_config()
     
     voices = {
         'host': {
             'voice': host_voice,
             'voice_id': await select_voice_id(host_gender, config) if host_gender else None,
-            'voice_settings': host_voice_settings
+            'voice_settings': HOST_VOICE_SETTINGS
         },
         'guest': {
             'voice': guest_voice,
             'voice_id': await select_voice_id(guest_gender, config) if guest_gender else None,
-            'voice_settings': guest_voice_settings
+            'voice_settings': GUEST_VOICE_SETTINGS
         }
     }
     
     return voices
 
+def render_speech(client, text, voice, speaker):
+    """
+    Synthesize one line of dialogue as raw PCM.
+    
+    Blocking: makes the ElevenLabs request, so call it from a worker thread.
+    
+    Args:
+        client (ElevenLabs): ElevenLabs client
+        text (str): Text to speak
+        voice (Voice): Voice to speak it with
+        speaker (str): Speaker name, for error messages
+        
+    Returns:
+        bytes: 16-bit mono little-endian PCM at PCM_FRAME_RATE
+    """
+    audio_response = client.generate(
+        text=text,
+        voice=voice,
+        model="eleven_multilingual_v2",
+        output_format=PCM_OUTPUT_FORMAT
+    )
+    
+    chunks = []
+    for chunk in audio_response:
+        if chunk:
+            chunks.append(chunk)
+        else:
+            logger.warning("Received empty audio chunk")
+    
+    pcm = b"".join(chunks)
+    if not pcm:
+        raise ValueError(f"No audio data generated for {speaker}")
+    
+    # Drop a trailing partial sample so lines stay frame-aligned when joined
+    return pcm[:len(pcm) - len(pcm) % PCM_SAMPLE_WIDTH]
+
 async def generate_podcast_audio(transcript, host_voice=None, host_gender=None, 
                           guest_voice=None, guest_gender=None, 
                           host_name="Host", guest_name="Guest"):
@@ -134,7 +190,7 @@ async def generate_podcast_audio(transcript, host_voice=None, host_gender=None,
     Returns:
         tuple: Filename and full path of generated audio
     """
-    client = await init_client()
+    client = init_client()
     
     conversations = await preprocess_transcript(transcript, host_name, guest_name)
     # logger.debug(f"Processing {len(conversations)} conversation segments")
@@ -145,56 +201,40 @@ async def generate_podcast_audio(transcript, host_voice=None, host_gender=None,
     
     voices = await setup_voices(host_voice, host_gender, guest_voice, guest_gender)
     
-    combined_audio = AudioSegment.empty()
-    
-    for entry in conversations:
+    async def render(entry):
         role = entry['role']
-        text = entry['text']
+        current_speaker = host_name if role == 'host' else guest_name
         
         if voices[role]['voice']:
             voice_obj = voices[role]['voice']
-            current_speaker = host_name if role == 'host' else guest_name
         else:
-            voice_id = voices[role]['voice_id']
-            settings = voices[role]['voice_settings']
-            voice_obj = Voice(voice_id=voice_id, settings=settings)
-            current_speaker = host_name if role == 'host' else guest_name
+            voice_obj = Voice(voice_id=voices[role]['voice_id'], settings=voices[role]['voice_settings'])
         
         try:
-            audio_response = client.generate(
-                text=text,
-                voice=voice_obj,
-                model="eleven_multilingual_v2"
-            )
-            
-            buffer = io.BytesIO()
-            
-            for chunk in audio_response:
-                if chunk:
-                    buffer.write(chunk)
-                else:
-                    logger.warning("Received empty audio chunk")
-                    
-            if buffer.tell() == 0:
-                raise ValueError(f"No audio data generated for {current_speaker}")
-            
-            buffer.seek(0)
-            
-            try:
-                audio_segment = AudioSegment.from_file(buffer, format="mp3")
-            except Exception as e:
-                logger.error("Failed to parse audio buffer", exc_info=True)
-                raise ValueError(f"Invalid audio data for {current_speaker}") from e
-            
-            combined_audio += audio_segment
-            # logger.info(f"Added {len(audio_segment)}ms audio for {current_speaker}")
-                        
-            delay_duration = random.uniform(0.2, 0.5) * 1000  
-            combined_audio += AudioSegment.silent(duration=delay_duration)
-                    
+            async with _TTS_SEM:
+                return await asyncio.to_thread(render_speech, client, entry['text'], voice_obj, current_speaker)
         except Exception as e:
             logger.error(f"Error generating audio for {current_speaker}", exc_info=True)
             raise e
+    
+    # Lines are rendered concurrently; gather keeps them in transcript order
+    pcm_segments = await asyncio.gather(*[render(entry) for entry in conversations])
+    
+    pcm_parts = []
+    
+    for pcm in pcm_segments:
+        pcm_parts.append(pcm)
+                    
+        delay_duration = random.uniform(0.2, 0.5)
+        pcm_parts.append(b"\x00" * (int(delay_duration * PCM_FRAME_RATE) * PCM_SAMPLE_WIDTH))
+    
+    # The lines are already PCM, so the only codec run is the final MP3 encode
+    combined_audio = AudioSegment(
+        data=b"".join(pcm_parts),
+        sample_width=PCM_SAMPLE_WIDTH,
+        frame_rate=PCM_FRAME_RATE,
+        channels=1
+    )
         
     if len(combined_audio) == 0:
         raise ValueError("Failed to generate any audio content")
@@ -204,7 +244,8 @@ async def generate_podcast_audio(transcript, host_voice=None, host_gender=None,
     
     temp_file_path = tempfile.mktemp(suffix=".mp3")
     
-    combined_audio.export(temp_file_path, format="mp3")
+    # MP3 encoding is CPU-bound; keep it off the event loop
+    await asyncio.to_thread(combined_audio.export, temp_file_path, format="mp3")
     
     # logger.info(f"Audio file saved to {temp_file_path}")
     return filename, temp_file_path
@@ -234,7 +275,7 @@ async def setup_voice_for_role(role, voice_file, gender):
         if voice_file and os.path.exists(voice_file):
             name = f"{role.capitalize()} Voice"
             description = f"Cloned voice for {role}"
-            voice = await clone_voice(voice_file, name, description)
+            voice = await clone_voice_async(voice_file, name, description)
             return voice, gender
         else:
             return None, gender
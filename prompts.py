@@ -1,15 +1,11 @@
-podcast_planner_query_writer_instructions="""You are an expert technical writer, helping to plan a podcast. 
+# Each prompt is split into static instructions, which stay byte-identical
+# across calls so providers can serve them from their prompt cache, and a
+# dynamic context template filled in per call. See utils.build_cached_system.
 
-<Podcast topic>
-{topic}
-</Podcast topic>
-
-<Podcast organization>
-{podcast_organization}
-</Podcast organization>
+podcast_planner_query_writer_instructions="""You are an expert technical writer, helping to plan a podcast.
 
 <Task>
-Your goal is to generate {number_of_queries} search queries that will help gather comprehensive information for planning the podcast segments. 
+Your goal is to generate search queries that will help gather comprehensive information for planning the podcast segments.
 
 The queries should:
 
@@ -21,6 +17,19 @@ Make the queries specific enough to find high-quality, relevant sources while co
 </Task>
 """
 
+podcast_planner_query_writer_context="""<Podcast topic>
+{topic}
+</Podcast topic>
+
+<Podcast organization>
+{podcast_organization}
+</Podcast organization>
+
+<Number of queries>
+Generate {number_of_queries} search queries.
+</Number of queries>
+"""
+
 podcast_planner_instructions = """I want a plan for a podcast episode.
 
 <Task>
@@ -32,11 +41,19 @@ Each segment should have:
 - Description - Key points to cover
 - Research - Whether to perform web research
 - Dialogue - To be populated later with host-guest conversation
+- Search queries - Targeted web search queries for segments that need research
 
 Opening and closing segments don't require research as they'll summarize the discussion.
+
+For each research segment, write search queries that:
+1. Examine different aspects of the segment topic
+2. Find industry latest news
+3. Are specific enough to find high-quality, relevant sources
+Leave search queries empty for segments without research.
 </Task>
+"""
 
-<Topic>
+podcast_planner_context = """<Topic>
 {topic}
 </Topic>
 
@@ -47,47 +64,21 @@ Opening and closing segments don't require research as they'll summarize the dis
 <Context>
 {context}
 </Context>
-"""
 
-query_writer_instructions="""You are an expert technical writer crafting targeted web search queries that will gather comprehensive information for writing a technical podcast segment.
-
-<Segment topic>
-{segment_topic}
-</Segment topic>
-
-<Task>
-Your goal is to generate {number_of_queries} search queries that will help gather comprehensive information above the segment topic. 
-
-The queries should:
-
-1. Be related to the topic 
-2. Examine different aspects of the topic
-3. Find industry latest news
-
-Make the queries specific enough to find high-quality, relevant sources.
-</Task>
+<Number of queries>
+Generate {number_of_queries} search queries for each research segment.
+</Number of queries>
 """
 
 dialogue_writer_instructions = """You are an expert podcast scriptwriter creating natural dialogue between a host and guest.
 
-<Segment topic>
-{segment_topic}
-</Segment topic>
-
-<Research material>
-{context}
-</Research material>
-
-<Format>
-{host_name}: <dialogue>
-{guest_name}: <dialogue>
-
+<Conversation markers>
 Use natural conversation markers:
 - Brief pauses: ...
 - Emphasis: *word*
 - Interruptions: --
 - Agreement: "Mm-hmm", "Right", "Exactly"
-</Format>
+</Conversation markers>
 
 <Style guidelines>
 - Keep exchanges to 2-3 sentences
@@ -101,7 +92,7 @@ Use natural conversation markers:
 <Formatting rules>
 - Do NOT include:
   - Descriptive actions in *brackets* or any other formatting
-  - Stage directions 
+  - Stage directions
   - Non-spoken performance notes
 - ONLY include:
   - Spoken dialogue
@@ -115,40 +106,34 @@ Use natural conversation markers:
 - Balanced speaking time
 - Engaging dialogue
 </Quality checks>
-"""
 
-transcript_optimizer_instructions = """Review and optimize a podcast segment transcript:
-
-<segment transcript>
-{transcript}
-</segment transcript>
-
-<task>
-Evaluate for:
+<Self review>
+After writing the dialogue, review it for:
 - Natural conversation flow
 - Clear explanations
 - Engaging delivery
 - Smooth transitions
 
-Suggest specific improvements for any issues found.
-</task>
-
-<format>
-  grade: Literal["pass","fail"]
-  improvement_suggestions: List[str]
-  revised_transcript: Optional[str]
-</format>
+Grade it "pass" or "fail". If it fails, list specific improvement suggestions and give a revised version of the dialogue in the same format.
+Only add follow-up search queries when the dialogue needs research material that is missing.
+</Self review>
 """
 
-final_segment_writer_instructions = """Create opening/closing podcast segments that tie the episode together.
-
-<Segment type>
-{segment_type}
-</Segment type>
+dialogue_writer_context = """<Segment topic>
+{segment_topic}
+</Segment topic>
 
-<Episode content>
+<Research material>
 {context}
-</Episode content>
+</Research material>
+
+<Format>
+{host_name}: <dialogue>
+{guest_name}: <dialogue>
+</Format>
+"""
+
+final_segment_writer_instructions = """Create opening/closing podcast segments that tie the episode together.
 
 <Task>
 For Opening:
@@ -169,4 +154,13 @@ Writing approach:
 - Clear transitions
 - Engaging hooks
 </Task>
-"""
\ No newline at end of file
+"""
+
+final_segment_writer_context = """<Segment type>
+{segment_type}
+</Segment type>
+
+<Episode content>
+{context}
+</Episode content>
+"""
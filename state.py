@@ -1,6 +1,10 @@
 from typing import Annotated, List, Literal, TypedDict, Optional
-from pydantic import BaseModel, Field
-import operator
+from pydantic import BaseModel, ConfigDict, Field
+
+class SearchQuery(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    search_query: str = Field(None, description="Query for web search.")
 
 class PodcastSegment(BaseModel):
     title: str = Field(description="Title for this segment of the podcast")
@@ -8,24 +12,36 @@ class PodcastSegment(BaseModel):
     description: str = Field(description="Topics and concepts to cover")
     research: bool = Field(description="Whether to perform web research")
     dialogue: str = Field(description="The host-guest conversation script")
+    search_queries: List[SearchQuery] = Field(
+        default_factory=list,
+        description="Web search queries for this segment, only when research is needed"
+    )
 
 class Segments(BaseModel):
     segments: List[PodcastSegment] = Field(description="Segments of the podcast")
 
-class SearchQuery(BaseModel):
-    search_query: str = Field(None, description="Query for web search.")
-
 class Queries(BaseModel):
     queries: List[SearchQuery] = Field(description="List of search queries.",)
 
-class DialogueFeedback(BaseModel):
+class DialogueWithFeedback(BaseModel):
+    dialogue: str = Field(description="The host-guest conversation script")
     grade: Literal["pass","fail"] = Field(
         description="Evaluation result indicating whether the dialogue meets requirements"
     )
     improvement_suggestions: List[str] = Field(description="Suggested improvements")
-    revised_transcript: Optional[str] = Field(description="Revised dialogue if needed")
+    revised_transcript: Optional[str] = Field(None, description="Revised dialogue if needed")
     follow_up_queries: List[SearchQuery] = Field(description="Additional research queries if needed")
 
+def _merge_segments(old: dict, new) -> dict:
+    """Merge completed segments into the title-keyed dict in place"""
+    if old is None:
+        old = {}
+    if isinstance(new, dict):
+        old.update(new)
+    else:
+        old.update({s.title: s for s in (new if isinstance(new, list) else [new])})
+    return old
+
 class PodcastStateInput(TypedDict):
     topic: str
     host: str
@@ -40,7 +56,7 @@ class PodcastState(TypedDict):
     guest: str
     feedback_on_podcast_plan: str
     segments: list[PodcastSegment]
-    completed_segments: Annotated[list, operator.add]
+    completed_segments: Annotated[dict, _merge_segments]
     episode_segments_from_research: str
     final_transcript: str
 
@@ -49,10 +65,5 @@ class SegmentState(TypedDict):
     search_iterations: int
     search_queries: list[SearchQuery]
     source_str: str
-    episode_segments_from_research: str
-    completed_segments: list[PodcastSegment]
     host: str
-    guest: str 
-
-class SegmentOutputState(TypedDict):
-    completed_segments: list[PodcastSegment] 
\ No newline at end of file
+    guest: str
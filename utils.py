@@ -1,17 +1,130 @@
 import os
+import time
 import asyncio
+from collections import OrderedDict
+from functools import lru_cache
 import requests
 
 from tavily import AsyncTavilyClient
+from langchain_core.caches import BaseCache
+from langchain_core.load import loads
+from langchain_core.messages import SystemMessage
+from langchain_community.cache import SQLiteCache
+from sqlalchemy.orm import Session
 from state import PodcastSegment
+from credentials import get_api_key, key_fingerprint
 from langsmith import traceable
 
+TAVILY_CACHE_TTL = float(os.getenv("TAVILY_CACHE_TTL", "3600"))
+TAVILY_CACHE_MAXSIZE = int(os.getenv("TAVILY_CACHE_MAXSIZE", "256"))
+
+TAVILY_CONCURRENCY = int(os.getenv("TAVILY_CONCURRENCY", "8"))
+
+# Twice the 500-token (~4 chars/token) budget deduplicate_and_format_sources
+# uses, so its truncation marker still applies.
+MAX_RAW_CONTENT_CHARS = 500 * 4 * 2
+
+# (api key, query) -> (fetched_at, response), least recently used first
+_search_cache: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+_tavily_semaphore = asyncio.Semaphore(TAVILY_CONCURRENCY)
+
+@lru_cache(maxsize=8)
+def _get_tavily_client(api_key):
+    """Reuse one Tavily client per API key"""
+    return AsyncTavilyClient(api_key=api_key)
+
+class ScopedTTLSQLiteCache(BaseCache):
+    """
+    SQLiteCache whose entries expire and are scoped to the caller's LLM API keys.
+
+    Each cached generation carries its write time in generation_info; lookups
+    older than ttl seconds miss, and expired rows are swept from the database
+    at most once per ttl. The cache key is prefixed with fingerprints of the
+    OpenAI and Anthropic keys in effect, so one tenant's paid responses are
+    never served to another.
+    """
+
+    _CACHED_AT = "cached_at"
+
+    def __init__(self, database_path: str, ttl: float):
+        self._cache = SQLiteCache(database_path=database_path)
+        self._ttl = ttl
+        self._last_prune = 0.0
+
+    @staticmethod
+    def _scoped(llm_string: str) -> str:
+        fingerprints = ",".join(key_fingerprint(get_api_key(provider)) for provider in ("openai", "anthropic"))
+        return f"{fingerprints}|{llm_string}"
+
+    def _expired(self, generation, now: float) -> bool:
+        cached_at = (generation.generation_info or {}).get(self._CACHED_AT)
+        return cached_at is None or now - cached_at >= self._ttl
+
+    def lookup(self, prompt, llm_string):
+        generations = self._cache.lookup(prompt, self._scoped(llm_string))
+        if not generations or self._expired(generations[0], time.time()):
+            return None
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        now = time.time()
+        stamped = [
+            g.model_copy(update={"generation_info": {**(g.generation_info or {}), self._CACHED_AT: now}})
+            for g in return_val
+        ]
+        self._cache.update(prompt, self._scoped(llm_string), stamped)
+
+        if now - self._last_prune >= self._ttl:
+            self._last_prune = now
+            self._prune(now)
+
+    def clear(self, **kwargs):
+        self._cache.clear(**kwargs)
+
+    def _prune(self, now: float):
+        """Delete every entry whose first generation has expired"""
+        schema = self._cache.cache_schema
+        with Session(self._cache.engine) as session, session.begin():
+            rows = session.query(schema.prompt, schema.llm, schema.response).filter(schema.idx == 0).all()
+            for prompt, llm, response in rows:
+                try:
+                    expired = self._expired(loads(response), now)
+                except Exception:
+                    expired = True
+                if expired:
+                    session.query(schema).filter(schema.prompt == prompt, schema.llm == llm).delete()
+
 def get_config_value(value):
     """
     Helper function to handle both string and enum cases of configuration values
     """
     return value if isinstance(value, str) else value.value
 
+def build_cached_system(prefix: str, dynamic: str, provider: str) -> SystemMessage:
+    """
+    Build a system message whose static prefix can be served from the provider's prompt cache.
+
+    Anthropic only caches up to an explicit cache_control breakpoint, so the
+    prefix goes in its own content block marked ephemeral. OpenAI caches
+    matching prompt prefixes automatically, so there the prefix just has to
+    come first. Either way the prefix must be byte-identical across calls,
+    and providers skip caching below their minimum prefix length.
+
+    Args:
+        prefix: Static instructions shared by every call
+        dynamic: Per-call context
+        provider: Model provider name, e.g. 'anthropic' or 'openai'
+
+    Returns:
+        SystemMessage: Message with the prefix first and the dynamic part last
+    """
+    if provider == "anthropic":
+        return SystemMessage(content=[
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": dynamic},
+        ])
+    return SystemMessage(content=f"{prefix}\n{dynamic}")
+
 def deduplicate_and_format_sources(search_response, max_tokens_per_source, include_raw_content=True):
     """
     Takes a list of search responses and formats them into a readable string.
@@ -32,50 +145,58 @@ def deduplicate_and_format_sources(search_response, max_tokens_per_source, inclu
     Returns:
         str: Formatted string with deduplicated sources
     """
-    sources_list = []
-    for response in search_response:
-        sources_list.extend(response['results'])
-    
-    unique_sources = {source['url']: source for source in sources_list}
+    unique_sources = {
+        source['url']: source
+        for response in search_response
+        for source in response['results']
+    }
 
-    formatted_text = "Sources:\n\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"Source {source['title']}:\n===\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += f"Most relevant content from source: {source['content']}\n===\n"
+    char_limit = max_tokens_per_source * 4
+    parts = ["Sources:\n\n"]
+    for source in unique_sources.values():
+        parts.append(f"Source {source['title']}:\n===\n")
+        parts.append(f"URL: {source['url']}\n===\n")
+        parts.append(f"Most relevant content from source: {source['content']}\n===\n")
         if include_raw_content:
-            char_limit = max_tokens_per_source * 4
             raw_content = source.get('raw_content', '')
             if raw_content is None:
                 raw_content = ''
                 print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
-            formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
+            truncated = raw_content[:char_limit]
+            suffix = "... [truncated]" if len(truncated) < len(raw_content) else ""
+            parts.append(f"Full source content limited to {max_tokens_per_source} tokens: {truncated}{suffix}\n\n")
                 
-    return formatted_text.strip()
+    return "".join(parts).strip()
 
 def format_segments(segments: list[PodcastSegment]) -> str:
-   formatted_str = ""
-   for idx, segment in enumerate(segments, 1):
-       formatted_str += f"""
-           {'='*60}
-           Segment {idx}: {segment.title}
-           {'='*60}
-           Duration: {segment.duration}
-           Description: {segment.description}
-           Requires Research: {segment.research}
-
-           Dialogue:
-           {segment.dialogue if segment.dialogue else '[Not yet written]'}
-       """
-   return formatted_str
+    divider = '=' * 60
+    chunks = []
+    for idx, segment in enumerate(segments, 1):
+        chunks.append(
+            f"\n{divider}\n"
+            f"Segment {idx}: {segment.title}\n"
+            f"{divider}\n"
+            f"Duration: {segment.duration}\n"
+            f"Description: {segment.description}\n"
+            f"Requires Research: {segment.research}\n\n"
+            f"Dialogue:\n"
+            f"{segment.dialogue if segment.dialogue else '[Not yet written]'}\n"
+        )
+    return "".join(chunks)
 
 @traceable
 async def tavily_search_async(search_queries):
     """
     Performs concurrent web searches using the Tavily API.
 
+    Duplicate queries are searched once, and responses are cached in-process
+    for TAVILY_CACHE_TTL seconds (default 3600, 0 disables the cache) in an
+    LRU of at most TAVILY_CACHE_MAXSIZE entries (default 256). Cache entries
+    are keyed by Tavily API key as well as query, so one tenant's searches
+    are never served to another. At most
+    TAVILY_CONCURRENCY searches (default 8) are in flight at once across
+    all callers. raw_content is truncated to MAX_RAW_CONTENT_CHARS on receipt.
+
     Args:
         search_queries (List[SearchQuery]): List of search queries to process
 
@@ -99,19 +220,46 @@ async def tavily_search_async(search_queries):
                 }
     """
     
-    tavily_async_client = AsyncTavilyClient()
-    
-    search_tasks = []
-    for query in search_queries:
-            search_tasks.append(
-                tavily_async_client.search(
-                    query,
-                    max_results=5,
-                    include_raw_content=True,
-                    topic="general"
-                )
+    # Identical queries (within this call or from a recent one) hit the API once
+    now = time.monotonic()
+    api_key = get_api_key("tavily")
+
+    responses = {}
+    for query in dict.fromkeys(search_queries):
+        cached = _search_cache.get((api_key, query))
+        if cached is None:
+            continue
+        if now - cached[0] >= TAVILY_CACHE_TTL:
+            del _search_cache[(api_key, query)]
+            continue
+        _search_cache.move_to_end((api_key, query))
+        responses[query] = cached[1]
+    to_fetch = [q for q in dict.fromkeys(search_queries) if q not in responses]
+
+    tavily_async_client = _get_tavily_client(api_key)
+
+    async def search(query):
+        async with _tavily_semaphore:
+            return await tavily_async_client.search(
+                query,
+                max_results=5,
+                include_raw_content=True,
+                topic="general"
             )
 
-    search_docs = await asyncio.gather(*search_tasks)
+    search_docs = await asyncio.gather(*[search(query) for query in to_fetch])
+
+    for query, doc in zip(to_fetch, search_docs):
+        # Cap raw content on receipt so full articles aren't kept in memory,
+        # in the search cache or in graph state
+        for result in doc['results']:
+            if result.get('raw_content'):
+                result['raw_content'] = result['raw_content'][:MAX_RAW_CONTENT_CHARS]
+        responses[query] = doc
+        if TAVILY_CACHE_TTL > 0 and TAVILY_CACHE_MAXSIZE > 0:
+            _search_cache[(api_key, query)] = (now, doc)
+            _search_cache.move_to_end((api_key, query))
+            while len(_search_cache) > TAVILY_CACHE_MAXSIZE:
+                _search_cache.popitem(last=False)
 
-    return search_docs
\ No newline at end of file
+    return [responses[q] for q in search_queries]
\ No newline at end of file
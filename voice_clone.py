@@ -1,16 +1,69 @@
 import os
+import asyncio
+import atexit
 import json
+import hashlib
 import logging
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePath
+import httpx
 from elevenlabs.client import ElevenLabs
 from dotenv import load_dotenv
+from credentials import get_api_key
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def load_voice_config(config_path="voice_config.json"):
+# Only fall back to .env when the key isn't already in the environment
+# (e.g. set by the container), and never override what is there
+if not os.environ.get("ELEVENLABS_API_KEY"):
+    load_dotenv(override=False)
+
+# Clone results are memoised on disk so re-uploading the same sample reuses
+# the existing voice; set VOICE_CLONE_CACHE_DIR to an empty string to disable.
+VOICE_CLONE_CACHE_DIR = os.getenv("VOICE_CLONE_CACHE_DIR", ".voice_clone_cache")
+VOICE_MEMORY_CACHE_SIZE = 128
+HASH_CHUNK_SIZE = 1024 * 1024
+UPLOAD_BUFFER_SIZE = 4096
+
+# Reject samples above this size locally rather than after uploading them
+MAX_CLONE_BYTES = int(os.getenv("ELEVENLABS_MAX_CLONE_BYTES", str(10 * 1024 * 1024)))
+
+# Concurrent clone uploads per process; keep within the account's
+# concurrency limit to avoid 429s.
+MAX_CONCURRENT_CLONES = int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "4"))
+_CLONE_SEM = asyncio.Semaphore(MAX_CONCURRENT_CLONES)
+
+# cache key -> task uploading that clone
+_inflight_clones = {}
+
+# api key -> (ElevenLabs client, its httpx client), least recently used first
+MAX_CACHED_CLIENTS = 8
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+_voice_cache = OrderedDict()
+_voice_cache_lock = threading.Lock()
+
+# config_path -> (st_mtime_ns, parsed config)
+_config_cache = {}
+
+def load_voice_config(config_path="voice_config.json"):
     """
     Load voice IDs from configuration file.
     
+    The parsed file is cached and only re-read when its mtime changes.
+    
     Args:
         config_path (str): Path to the configuration file
         
@@ -18,30 +71,231 @@ async def load_voice_config(config_path="voice_config.json"):
         dict: Dictionary containing voice IDs for males and females
     """
     try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading voice configuration: {e}")
+        mtime = os.stat(config_path).st_mtime_ns
+    except FileNotFoundError:
+        # Cache the empty default too, so a missing file is only reported once
+        # and is picked up as soon as it appears
+        cached = _config_cache.get(config_path)
+        if cached and cached[0] is None:
+            return cached[1]
+        logger.warning("Voice configuration %s not found; no preset voices available", config_path)
+        config = {"males": [], "females": []}
+        _config_cache[config_path] = (None, config)
+        return config
+    
+    cached = _config_cache.get(config_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    try:
+        with open(config_path, 'rb') as f:
+            config = _json_loads(f.read())
+    except ValueError:
+        logger.exception("Error parsing voice configuration from %s", config_path)
+        raise
+    _config_cache[config_path] = (mtime, config)
+    return config
 
-async def init_client():
+def load_all_voice_configs(dir_path):
     """
-    Initialize ElevenLabs client with API key from environment.
+    Load every voice configuration file in a directory.
+    
+    Files are read in parallel and go through load_voice_config's cache.
     
+    Args:
+        dir_path (str): Directory containing *.json voice configuration files
+        
     Returns:
-        ElevenLabs: Initialized ElevenLabs client
+        dict: Path of each configuration file to its parsed configuration
     """
-    load_dotenv()
-    api_key = os.getenv("ELEVENLABS_API_KEY")
+    with os.scandir(dir_path) as entries:
+        paths = [entry.path for entry in entries if entry.is_file() and entry.name.endswith('.json')]
     
+    if not paths:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        return dict(zip(paths, executor.map(load_voice_config, paths)))
+
+def _require_key():
+    api_key = get_api_key("elevenlabs")
     if not api_key:
-        raise ValueError("ELEVENLABS_API_KEY environment variable not set")
+        raise ValueError("ElevenLabs API key not provided and ELEVENLABS_API_KEY environment variable not set")
+    return api_key
+
+def _get_client(api_key):
+    """
+    Return the ElevenLabs client for an API key, creating it on first use.
     
-    return ElevenLabs(api_key=api_key)
+    One client per key so its HTTP/2 connection pool is reused across podcasts
+    and concurrent requests multiplex over one TLS connection. Keys change per
+    request, so the least recently used client is dropped from the cache once
+    more than MAX_CACHED_CLIENTS are held. It is not closed then, since a
+    podcast may still be using it; its pool is closed when the last holder
+    releases the client.
+    """
+    with _clients_lock:
+        entry = _clients.get(api_key)
+        if entry is not None:
+            _clients.move_to_end(api_key)
+            return entry[0]
+        
+        httpx_client = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60)
+        )
+        client = ElevenLabs(api_key=api_key, httpx_client=httpx_client)
+        weakref.finalize(client, httpx_client.close)
+        _clients[api_key] = (client, httpx_client)
+        
+        if len(_clients) > MAX_CACHED_CLIENTS:
+            _clients.popitem(last=False)
+    
+    return client
+
+@atexit.register
+def _close_clients():
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for _, httpx_client in entries:
+        httpx_client.close()
+
+def init_client():
+    """
+    Return the ElevenLabs client for the request's API key, falling back to the environment.
+    
+    Clients are cached per API key, so repeated calls reuse the same
+    connection pool instead of doing a new TLS handshake.
+    
+    Returns:
+        ElevenLabs: Initialized ElevenLabs client
+    """
+    return _get_client(_require_key())
 
-async def clone_voice(voice_file, name=None, description=None):
+def _clone_cache_key(api_key, voice_file, name, description):
+    """
+    Hash the sample's bytes with the clone parameters and account.
+    
+    Voices belong to an ElevenLabs account, so the API key is part of the key.
+    
+    Returns:
+        str: Hex digest identifying this clone
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(voice_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    for part in (name or "", description or "", api_key):
+        digest.update(b"\0" + part.encode())
+    return digest.hexdigest()
+
+def _cache_path(key):
+    return os.path.join(VOICE_CLONE_CACHE_DIR, key[:2], key[2:4], f"{key}.json")
+
+def _remember_voice(key, voice):
+    with _voice_cache_lock:
+        _voice_cache[key] = voice
+        _voice_cache.move_to_end(key)
+        if len(_voice_cache) > VOICE_MEMORY_CACHE_SIZE:
+            _voice_cache.popitem(last=False)
+
+def _cached_voice(client, key):
+    """Return the voice cloned earlier for this key, from memory or disk, or None"""
+    with _voice_cache_lock:
+        voice = _voice_cache.get(key)
+        if voice is not None:
+            _voice_cache.move_to_end(key)
+            return voice
+    
+    if not VOICE_CLONE_CACHE_DIR:
+        return None
+    
+    try:
+        with open(_cache_path(key), 'rb') as f:
+            voice_id = json.load(f)["voice_id"]
+    except (OSError, ValueError, KeyError):
+        return None
+    
+    try:
+        voice = client.voices.get(voice_id)
+    except Exception as e:
+        # The voice may have been deleted from the account; clone it again
+        logger.warning("Cached voice %s could not be fetched: %s", voice_id, e)
+        return None
+    
+    _remember_voice(key, voice)
+    return voice
+
+def _store_voice(key, voice):
+    _remember_voice(key, voice)
+    
+    if not VOICE_CLONE_CACHE_DIR:
+        return
+    
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            json.dump({"voice_id": voice.voice_id}, f)
+        os.replace(f.name, path)
+    except OSError as e:
+        logger.warning("Could not write voice clone cache entry %s: %s", path, e)
+
+def _prepare_clone(voice_file, name, description):
+    """
+    Check the sample and build its cache key.
+    
+    Returns:
+        tuple: (api_key, name, description, cache key)
+    """
+    # Fail fast on bad samples before opening a connection to ElevenLabs
+    try:
+        size = os.stat(voice_file).st_size
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Voice sample not found: {voice_file}")
+    if size == 0:
+        raise ValueError(f"Voice sample is empty: {voice_file}")
+    if size > MAX_CLONE_BYTES:
+        raise ValueError(f"Voice sample is {size} bytes, over the {MAX_CLONE_BYTES} byte limit: {voice_file}")
+    
+    api_key = _require_key()
+    
+    return api_key, name, description, _clone_cache_key(api_key, voice_file, name, description)
+
+def _clone_prepared(voice_file, api_key, name, description, key):
+    client = _get_client(api_key)
+    
+    voice = _cached_voice(client, key)
+    if voice is not None:
+        return voice
+    
+    try:
+        # client.clone() opens the paths itself and never closes them, so
+        # call voices.add/voices.get (what clone() wraps) with our own handle
+        with open(voice_file, 'rb', buffering=UPLOAD_BUFFER_SIZE) as f:
+            response = client.voices.add(
+                name=name or PurePath(voice_file).stem,
+                description=description or f"Cloned voice from {voice_file}",
+                files=[f],
+                labels="{}",
+            )
+        voice = client.voices.get(response.voice_id)
+    except Exception:
+        logger.exception("Error cloning voice for %s", voice_file)
+        raise
+    
+    _store_voice(key, voice)
+    return voice
+
+def clone_voice(voice_file, name=None, description=None):
     """
     Clone a voice from an audio file.
     
+    Blocking: uploads the sample to ElevenLabs, so async callers should use
+    clone_voice_async().
+    
     Args:
         voice_file (str): Path to the audio file
         name (str, optional): Name for the cloned voice
@@ -50,21 +304,52 @@ async def clone_voice(voice_file, name=None, description=None):
     Returns:
         Voice: Cloned voice object that can be used with generate()
     """
-    client = await init_client()
+    return _clone_prepared(voice_file, *_prepare_clone(voice_file, name, description))
+
+async def _clone_limited(voice_file, api_key, name, description, key):
+    async with _CLONE_SEM:
+        return await asyncio.to_thread(_clone_prepared, voice_file, api_key, name, description, key)
+
+async def clone_voices(voice_files, names=None, descriptions=None):
+    """
+    Clone several voices concurrently.
     
-    if not name:
-        name = os.path.splitext(os.path.basename(voice_file))[0]
+    Args:
+        voice_files (list): Paths to the audio files
+        names (list, optional): Name for each cloned voice
+        descriptions (list, optional): Description for each cloned voice
+        
+    Returns:
+        list: Cloned Voice objects, or the exception raised for that file, in input order
+    """
+    names = names or [None] * len(voice_files)
+    descriptions = descriptions or [None] * len(voice_files)
     
-    if not description:
-        description = f"Cloned voice from {voice_file}"
+    return await asyncio.gather(*[
+        clone_voice_async(voice_file, name, description)
+        for voice_file, name, description in zip(voice_files, names, descriptions)
+    ], return_exceptions=True)
+
+async def clone_voice_async(voice_file, name=None, description=None):
+    """
+    Clone a voice from an audio file without blocking the event loop.
     
-    try:
-        voice = client.clone(
-            name=name,
-            description=description,
-            files=[voice_file],
-        )
-        return voice
-    except Exception as e:
-        logger.error(f"Error cloning voice: {e}")
-        raise
\ No newline at end of file
+    Args:
+        voice_file (str): Path to the audio file
+        name (str, optional): Name for the cloned voice
+        description (str, optional): Description for the cloned voice
+        
+    Returns:
+        Voice: Cloned voice object that can be used with generate()
+    """
+    api_key, name, description, key = await asyncio.to_thread(_prepare_clone, voice_file, name, description)
+    
+    # Concurrent clones of the same sample share one upload
+    task = _inflight_clones.get(key)
+    if task is None:
+        task = asyncio.create_task(_clone_limited(voice_file, api_key, name, description, key))
+        _inflight_clones[key] = task
+        task.add_done_callback(lambda _: _inflight_clones.pop(key, None))
+    
+    # Shield so one caller being cancelled doesn't cancel the others' upload
+    return await asyncio.shield(task)